@@ -15,17 +15,20 @@ from __future__ import absolute_import
 import json
 import os
 import tarfile
-from six.moves.urllib.parse import urlparse
 
-import boto3
 import pytest
 
 import sagemaker.utils
+from sagemaker import fw_utils
 import tests.integ as integ
 from sagemaker.tensorflow import TensorFlow
 from tests.integ import timeout
 
-horovod_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'horovod')
+# tarfile reads compressed streams in 10 KiB chunks by default.
+TAR_BUFSIZE = 1024 * 1024
+MPI_DISTRIBUTION = {'mpi': {'enabled': True}}
+
+horovod_dir = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'data', 'horovod'))
 
 
 @pytest.mark.canary_quick
@@ -40,23 +43,24 @@ def test_horovod(sagemaker_session, instance_type, tmpdir):
                            py_version=integ.PYTHON_VERSION,
                            script_mode=True,
                            framework_version='1.12',
-                           distributions={'mpi': {'enabled': True}})
+                           distributions=MPI_DISTRIBUTION)
 
     with timeout.timeout(minutes=integ.TRAINING_DEFAULT_TIMEOUT_MINUTES):
         estimator.fit(job_name=job_name)
 
         tmp = str(tmpdir)
-        extract_files_from_s3(estimator.model_data, tmp)
+        extract_files_from_s3(sagemaker_session.boto_session, estimator.model_data, tmp)
 
+        ranks = read_ranks(tmp)
         for rank in range(2):
-            assert read_json('rank-%s' % rank, tmp)['rank'] == rank
+            assert ranks[rank]['rank'] == rank
 
 
 @pytest.mark.local_mode
 @pytest.mark.parametrize('instances, processes', [
     [1, 2],
     (2, 1),
-    (2, 2)])
+    (2, 2)], ids=['1x2', '2x1', '2x2'])
 def test_horovod_local_mode(sagemaker_local_session, instances, processes, tmpdir):
     output_path = 'file://%s' % tmpdir
     job_name = sagemaker.utils.unique_name_from_base('tf-horovod')
@@ -80,32 +84,20 @@ def test_horovod_local_mode(sagemaker_local_session, instances, processes, tmpdi
 
         size = instances * processes
 
+        ranks = read_ranks(tmp)
         for rank in range(size):
-            assert read_json('rank-%s' % rank, tmp)['rank'] == rank
+            assert ranks[rank]['rank'] == rank
 
 
 def extract_files(output_path, tmpdir):
-    with tarfile.open(os.path.join(output_path, 'model.tar.gz')) as tar:
-        def is_within_directory(directory, target):
-            
-            abs_directory = os.path.abspath(directory)
-            abs_target = os.path.abspath(target)
-        
-            prefix = os.path.commonprefix([abs_directory, abs_target])
-            
-            return prefix == abs_directory
-        
-        def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-        
-            for member in tar.getmembers():
-                member_path = os.path.join(path, member.name)
-                if not is_within_directory(path, member_path):
-                    raise Exception("Attempted Path Traversal in Tar File")
-        
-            tar.extractall(path, members, numeric_owner=numeric_owner) 
-            
-        
-        safe_extract(tar, tmpdir)
+    with open(os.path.join(output_path, 'model.tar.gz'), 'rb') as f:
+        with tarfile.open(fileobj=f, mode='r|gz', bufsize=TAR_BUFSIZE) as tar:
+            _safe_extract(tar, tmpdir)
+
+
+def read_ranks(tmp):
+    return {int(name[len('rank-'):]): read_json(name, tmp)
+            for name in os.listdir(tmp) if name.startswith('rank-')}
 
 
 def read_json(file, tmp):
@@ -113,31 +105,23 @@ def read_json(file, tmp):
         return json.load(f)
 
 
-def extract_files_from_s3(s3_url, tmpdir):
-    parsed_url = urlparse(s3_url)
-    s3 = boto3.resource('s3')
-
-    model = os.path.join(tmpdir, 'model')
-    s3.Bucket(parsed_url.netloc).download_file(parsed_url.path.lstrip('/'), model)
-
-    with tarfile.open(model, 'r') as tar_file:
-        def is_within_directory(directory, target):
-            
-            abs_directory = os.path.abspath(directory)
-            abs_target = os.path.abspath(target)
-        
-            prefix = os.path.commonprefix([abs_directory, abs_target])
-            
-            return prefix == abs_directory
-        
-        def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-        
-            for member in tar.getmembers():
-                member_path = os.path.join(path, member.name)
-                if not is_within_directory(path, member_path):
-                    raise Exception("Attempted Path Traversal in Tar File")
-        
-            tar.extractall(path, members, numeric_owner=numeric_owner) 
-            
-        
-        safe_extract(tar_file, tmpdir)
+def extract_files_from_s3(boto_session, s3_url, tmpdir):
+    bucket, key = fw_utils.parse_s3_url(s3_url)
+    body = boto_session.resource('s3').Object(bucket, key).get()['Body']
+
+    with tarfile.open(fileobj=body, mode='r|gz', bufsize=TAR_BUFSIZE) as tar_file:
+        _safe_extract(tar_file, tmpdir)
+
+
+def _safe_extract(tar, path):
+    # Every member must resolve to the destination itself or to somewhere beneath it.
+    real_path = os.path.realpath(path)
+    root = real_path + os.sep
+
+    # Members are checked and extracted one at a time, rather than through getmembers() and
+    # extractall(), so that archives opened in stream mode are only read once.
+    for member in tar:
+        member_path = os.path.realpath(os.path.join(real_path, member.name))
+        if member_path != real_path and not member_path.startswith(root):
+            raise Exception("Attempted Path Traversal in Tar File")
+        tar.extract(member, real_path)
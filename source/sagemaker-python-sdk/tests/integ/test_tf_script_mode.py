@@ -18,9 +18,8 @@ import time
 
 import pytest
 
-import boto3
+from sagemaker import fw_utils
 from sagemaker.tensorflow import TensorFlow
-from six.moves.urllib.parse import urlparse
 from sagemaker.utils import unique_name_from_base
 import tests.integ as integ
 from tests.integ import kms_utils
@@ -28,7 +27,7 @@ import tests.integ.timeout as timeout
 
 ROLE = 'SageMakerRole'
 
-RESOURCE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'tensorflow_mnist')
+RESOURCE_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'data', 'tensorflow_mnist'))
 SCRIPT = os.path.join(RESOURCE_PATH, 'mnist.py')
 PARAMETER_SERVER_DISTRIBUTION = {'parameter_server': {'enabled': True}}
 MPI_DISTRIBUTION = {'mpi': {'enabled': True}}
@@ -40,8 +39,14 @@ def instance_type(request):
     return request.param
 
 
+@pytest.fixture(scope='module')
+def mnist_inputs(sagemaker_session):
+    return sagemaker_session.upload_data(path=os.path.join(RESOURCE_PATH, 'data'),
+                                         key_prefix='scriptmode/mnist')
+
+
 @pytest.mark.skipif(integ.PYTHON_VERSION != 'py3', reason="Script Mode tests are only configured to run with Python 3")
-def test_mnist(sagemaker_session, instance_type):
+def test_mnist(sagemaker_session, instance_type, mnist_inputs):
     estimator = TensorFlow(entry_point=SCRIPT,
                            role='SageMakerRole',
                            train_instance_count=1,
@@ -51,20 +56,17 @@ def test_mnist(sagemaker_session, instance_type):
                            framework_version=TensorFlow.LATEST_VERSION,
                            metric_definitions=[{'Name': 'train:global_steps', 'Regex': r'global_step\/sec:\s(.*)'}],
                            base_job_name=unique_name_from_base('test-tf-sm-mnist'))
-    inputs = estimator.sagemaker_session.upload_data(
-        path=os.path.join(RESOURCE_PATH, 'data'),
-        key_prefix='scriptmode/mnist')
 
     with timeout.timeout(minutes=integ.TRAINING_DEFAULT_TIMEOUT_MINUTES):
-        estimator.fit(inputs)
-    _assert_s3_files_exist(estimator.model_dir,
+        estimator.fit(mnist_inputs)
+    _assert_s3_files_exist(sagemaker_session.boto_session, estimator.model_dir,
                            ['graph.pbtxt', 'model.ckpt-0.index', 'model.ckpt-0.meta'])
     df = estimator.training_job_analytics.dataframe()
     print(df)
     assert df.size > 0
 
 
-def test_server_side_encryption(sagemaker_session):
+def test_server_side_encryption(sagemaker_session, mnist_inputs):
 
     boto_session = sagemaker_session.boto_session
     with kms_utils.bucket_with_encryption(boto_session, ROLE) as (bucket_with_kms, kms_key):
@@ -84,17 +86,13 @@ def test_server_side_encryption(sagemaker_session):
                                model_dir='/opt/ml/model',
                                output_kms_key=kms_key)
 
-        inputs = estimator.sagemaker_session.upload_data(
-            path=os.path.join(RESOURCE_PATH, 'data'),
-            key_prefix='scriptmode/mnist')
-
         with timeout.timeout(minutes=integ.TRAINING_DEFAULT_TIMEOUT_MINUTES):
-            estimator.fit(inputs)
+            estimator.fit(mnist_inputs)
 
 
 @pytest.mark.canary_quick
 @pytest.mark.skipif(integ.PYTHON_VERSION != 'py3', reason="Script Mode tests are only configured to run with Python 3")
-def test_mnist_distributed(sagemaker_session, instance_type):
+def test_mnist_distributed(sagemaker_session, instance_type, mnist_inputs):
     estimator = TensorFlow(entry_point=SCRIPT,
                            role=ROLE,
                            train_instance_count=2,
@@ -106,17 +104,14 @@ def test_mnist_distributed(sagemaker_session, instance_type):
                            framework_version=TensorFlow.LATEST_VERSION,
                            distributions=PARAMETER_SERVER_DISTRIBUTION,
                            base_job_name=unique_name_from_base('test-tf-sm-mnist'))
-    inputs = estimator.sagemaker_session.upload_data(
-        path=os.path.join(RESOURCE_PATH, 'data'),
-        key_prefix='scriptmode/distributed_mnist')
 
     with timeout.timeout(minutes=integ.TRAINING_DEFAULT_TIMEOUT_MINUTES):
-        estimator.fit(inputs)
-    _assert_s3_files_exist(estimator.model_dir,
+        estimator.fit(mnist_inputs)
+    _assert_s3_files_exist(sagemaker_session.boto_session, estimator.model_dir,
                            ['graph.pbtxt', 'model.ckpt-0.index', 'model.ckpt-0.meta'])
 
 
-def test_mnist_async(sagemaker_session):
+def test_mnist_async(sagemaker_session, mnist_inputs):
     estimator = TensorFlow(entry_point=SCRIPT,
                            role=ROLE,
                            train_instance_count=1,
@@ -126,12 +121,9 @@ def test_mnist_async(sagemaker_session):
                            framework_version=TensorFlow.LATEST_VERSION,
                            base_job_name=unique_name_from_base('test-tf-sm-mnist'),
                            tags=TAGS)
-    inputs = estimator.sagemaker_session.upload_data(
-        path=os.path.join(RESOURCE_PATH, 'data'),
-        key_prefix='scriptmode/mnist')
-    estimator.fit(inputs, wait=False)
+    estimator.fit(mnist_inputs, wait=False)
     training_job_name = estimator.latest_training_job.name
-    time.sleep(20)
+    _wait_for_training_job_tags(sagemaker_session.sagemaker_client, training_job_name, TAGS)
     endpoint_name = training_job_name
     _assert_training_job_tags_match(sagemaker_session.sagemaker_client, estimator.latest_training_job.name, TAGS)
     with timeout.timeout_and_delete_endpoint_by_name(endpoint_name, sagemaker_session):
@@ -145,16 +137,29 @@ def test_mnist_async(sagemaker_session):
         _assert_model_tags_match(sagemaker_session.sagemaker_client, estimator.latest_training_job.name, TAGS)
 
 
-def _assert_s3_files_exist(s3_url, files):
-    parsed_url = urlparse(s3_url)
-    s3 = boto3.client('s3')
-    contents = s3.list_objects_v2(Bucket=parsed_url.netloc, Prefix=parsed_url.path.lstrip('/'))["Contents"]
+def _assert_s3_files_exist(boto_session, s3_url, files):
+    bucket, prefix = fw_utils.parse_s3_url(s3_url)
+    paginator = boto_session.client('s3').get_paginator('list_objects_v2')
+    pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
+    found = set()
+    for page in pages:
+        for x in page.get('Contents', []):
+            found.update(f for f in files if x['Key'].endswith(f))
     for f in files:
-        found = [x['Key'] for x in contents if x['Key'].endswith(f)]
-        if not found:
+        if f not in found:
             raise ValueError('File {} is not found under {}'.format(f, s3_url))
 
 
+def _wait_for_training_job_tags(sagemaker_client, training_job_name, tags, seconds=20):
+    training_job_description = sagemaker_client.describe_training_job(TrainingJobName=training_job_name)
+    training_job_arn = training_job_description['TrainingJobArn']
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if sagemaker_client.list_tags(ResourceArn=training_job_arn)['Tags'] == tags:
+            return
+        time.sleep(1)
+
+
 def _assert_tags_match(sagemaker_client, resource_arn, tags):
     actual_tags = sagemaker_client.list_tags(ResourceArn=resource_arn)['Tags']
     assert actual_tags == tags